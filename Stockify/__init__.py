@@ -1,3 +1,6 @@
-from .api import Data, HistoricalData
+from .api import (Data, HistoricalData, Quote, QuoteBatch, QuoteCache,
+                  ReferenceData)
 from .errors import StockifyError, StockifyAPIError
-from .core import Portfolio, Holding, Lot
\ No newline at end of file
+from .core import Portfolio, Holding, HoldingState, Lot, LotView
+from .journal import Journal
+from .batch import BatchEvaluator
\ No newline at end of file
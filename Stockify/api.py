@@ -1,4 +1,9 @@
 import json
+import math
+import os
+import threading
+import time
+from array import array
 import requests
 from .errors import StockifyError, StockifyAPIError
 
@@ -9,12 +14,19 @@ class Data(object):
     about stocks. Relies on the IEX Trading API.
     """
 
+    BATCH_LIMIT = 100
+    # The number of IEX API calls made, e.g. for reporting by batch jobs
+    request_count = 0
+
     @staticmethod
-    def quote(symbol):
+    def quote(symbol, fields=None):
         """Fetches a quote for a given symbol, including price and other data
 
         Args:
             symbol (str): The stock symbol to be quoted. Not case sensitive.
+            fields (list of str, optional): If specified only these quote
+                fields, e.g. ['latestPrice', 'open'], are requested from the
+                API, which is much smaller than the full quote.
         Returns:
             dict of str/int/float: JSON-like formatted quote containing info
                 like price (latest/open/close), company name, quote time, and
@@ -26,7 +38,10 @@ class Data(object):
         """
 
         quote_url = f'https://api.iextrading.com/1.0/stock/{symbol}/quote'
+        if fields:
+            quote_url += f'?filter={",".join(fields)}'
         response = requests.get(quote_url)
+        Data.request_count += 1
         if response.status_code != 200:
             message = (f'API call failed with status code '
                        f'{response.status_code}: {json.loads(response.text)}')
@@ -51,6 +66,74 @@ class Data(object):
         quote_list = [{symbol: Data.quote(symbol)} for symbol in symbol_list]
         return quote_list
 
+    @staticmethod
+    def batch_quote(symbol_list, fields=None):
+        """Fetches quotes for many symbols using the IEX batch endpoint
+
+        Unlike .quotes(), which makes one API call per symbol, symbols are
+        requested in groups of up to 100 (the IEX batch limit), so the number
+        of API calls grows with len(symbol_list) / 100.
+
+        Args:
+            symbol_list (list of str): The stock symbols to be quoted. Not case
+                sensitive, duplicates are only requested once.
+            fields (list of str, optional): If specified only these quote
+                fields are requested from the API.
+        Returns:
+            dict of quotes: Key:Value pairs of 'SYMBOL':quote, keyed by the
+                upper case symbol. See documents on the .quote() method for
+                more detail on the quote dict.
+        Raises:
+            StockifyAPIError: If the API returns a non-200 status code.
+        """
+
+        symbols = sorted({symbol.upper() for symbol in symbol_list})
+        quote_dict = {}
+        for start in range(0, len(symbols), Data.BATCH_LIMIT):
+            chunk = symbols[start:start + Data.BATCH_LIMIT]
+            batch_url = (f'https://api.iextrading.com/1.0/stock/market/batch'
+                         f'?symbols={",".join(chunk)}&types=quote')
+            if fields:
+                batch_url += f'&filter={",".join(fields)}'
+            response = requests.get(batch_url)
+            Data.request_count += 1
+            if response.status_code != 200:
+                message = (f'API call failed with status code '
+                           f'{response.status_code}: {response.text}')
+                raise StockifyAPIError(message)
+            decoded = json.loads(response.text)
+            for symbol, data in decoded.items():
+                quote_dict[symbol.upper()] = data['quote']
+        return quote_dict
+
+    @staticmethod
+    def compact_quote(symbol):
+        """Fetches only the latest and open price of a symbol as a Quote
+
+        Args:
+            symbol (str): The stock symbol to be quoted. Not case sensitive.
+        Returns:
+            Quote: The symbol's latest and open price.
+        """
+
+        data = Data.quote(symbol, fields=Quote.FIELDS)
+        return Quote(symbol, _price(data.get('latestPrice')),
+                     _price(data.get('open')))
+
+    @staticmethod
+    def compact_quotes(symbol_list):
+        """Fetches only the latest and open prices of many symbols
+
+        Args:
+            symbol_list (list of str): The stock symbols to be quoted.
+        Returns:
+            QuoteBatch: The latest and open prices of each symbol found, stored
+                in arrays rather than one dict per symbol.
+        """
+
+        quotes = Data.batch_quote(symbol_list, fields=Quote.FIELDS)
+        return QuoteBatch(quotes)
+
     @staticmethod
     def price(symbol):
         """Quickly get the latest price, in USD, of a stock
@@ -62,12 +145,16 @@ class Data(object):
             float: Last quoted price, in USD, of the stock queried.
         """
 
-        return Data.quote(symbol)['latestPrice']
+        return Data.quote(symbol, fields=['latestPrice'])['latestPrice']
 
     @staticmethod
     def info(symbol):
         """Get basic information about a stock including name, sector, and price
 
+        The name, sector, and exchange are read from the persistent reference
+        data cache (see ReferenceData), so only the price is fetched on every
+        call.
+
         Args:
             symbol (str): The stock symbol whose information is to be returned.
                 Not case sensitive.
@@ -76,16 +163,345 @@ class Data(object):
                 name, sector, price, and primary exchange.
         """
 
-        data = Data.quote(symbol)
+        reference = ReferenceData.default().get(symbol)
         info_dict = {
-            'companyName': data['companyName'],
-            'sector': data['sector'],
-            'latestPrice': ['latestPrice'],
-            'primaryExchange': ['primaryExchange']
+            'companyName': reference['companyName'],
+            'sector': reference['sector'],
+            'latestPrice': Data.price(symbol),
+            'primaryExchange': reference['primaryExchange']
         }
         return info_dict
 
 
+class Quote(object):
+    """A compact quote holding only the prices used to value holdings
+
+    Prices the API did not return (e.g. the open price before the market
+    opens) are stored as NaN.
+
+    Args:
+        symbol (str): The stock symbol quoted.
+        latest_price (float): The latest price, in USD.
+        open (float): The price at open, in USD.
+    """
+
+    __slots__ = ('symbol', 'latest_price', 'open')
+
+    # The IEX quote fields needed to create a Quote
+    FIELDS = ('latestPrice', 'open')
+
+    def __init__(self, symbol, latest_price, open):
+
+        self.symbol = symbol.upper()
+        self.latest_price = latest_price
+        self.open = open
+
+    def __repr__(self):
+
+        return (f'Quote: {self.symbol}; Latest: {self.latest_price}; '
+                f'Open: {self.open}')
+
+
+class QuoteBatch(object):
+    """The latest and open prices of many symbols, stored as arrays
+
+    Prices are stored in two arrays of doubles indexed by symbol, rather than
+    a dict per symbol. Individual quotes can be accessed using subscript
+    notation, e.g. `batch['aapl']`, which returns a Quote.
+
+    Args:
+        quotes (dict of quotes): A 'SYMBOL':quote dict, as returned by
+            `Data.batch_quote()`, with the latestPrice and open fields. Missing
+            or null prices are stored as NaN.
+    """
+
+    def __init__(self, quotes):
+
+        self.symbols = tuple(quotes)
+        self.index = {symbol: i for i, symbol in enumerate(self.symbols)}
+        self.latest_prices = array('d', (
+            _price(quotes[symbol].get('latestPrice'))
+            for symbol in self.symbols))
+        self.open_prices = array('d', (_price(quotes[symbol].get('open'))
+                                       for symbol in self.symbols))
+
+    def __contains__(self, item):
+
+        return item.upper() in self.index
+
+    def __getitem__(self, item):
+
+        i = self.index[item.upper()]
+        return Quote(self.symbols[i], self.latest_prices[i],
+                     self.open_prices[i])
+
+    def __iter__(self):
+
+        return iter(self.symbols)
+
+    def __len__(self):
+
+        return len(self.symbols)
+
+
+class QuoteCache(object):
+    """A short-lived cache of compact quotes, used to value holdings and lots
+
+    Only symbols whose quote is older than the time to live are fetched, all
+    at once with `Data.compact_quotes()`. When a refreshed quote has the same
+    prices as the cached one, the cached Quote object is kept, so valuations
+    memoized against it stay valid; a Quote object is only replaced when its
+    prices change.
+
+    The cache is safe to share between threads. Refreshes are serialized, so
+    threads that find the same quotes stale make a single request between
+    them.
+
+    Args:
+        ttl (float, optional): The number of seconds a quote is valid for.
+            Defaults to 15.
+    """
+
+    DEFAULT_TTL = 15
+    _default = None
+    _default_lock = threading.Lock()
+
+    def __init__(self, ttl=DEFAULT_TTL):
+
+        self.ttl = ttl
+        # Key:Value pairs of 'SYMBOL':(time fetched, Quote)
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def default(cls):
+        """Returns the shared cache used by Portfolio, Holding and Lot
+
+        Returns:
+            QuoteCache: The default cache.
+        """
+
+        with cls._default_lock:
+            if cls._default is None:
+                cls._default = cls()
+        return cls._default
+
+    def _stale(self, symbols):
+
+        now = time.time()
+        return [symbol for symbol in symbols
+                if symbol not in self._entries
+                or now - self._entries[symbol][0] > self.ttl]
+
+    def get(self, symbol_list):
+        """Gets quotes for many symbols, fetching those that are stale
+
+        Args:
+            symbol_list (list of str): The stock symbols to be quoted. Not case
+                sensitive.
+        Returns:
+            dict of Quote: Key:Value pairs of 'SYMBOL':Quote.
+        Raises:
+            StockifyAPIError: If no quote, or no latest price, is returned for
+                a symbol.
+        """
+
+        symbols = {symbol.upper() for symbol in symbol_list}
+        if self._stale(symbols):
+            with self._lock:
+                # Another thread may have refreshed them while we waited
+                stale = self._stale(symbols)
+                if stale:
+                    self._refresh(stale)
+        return {symbol: self._entries[symbol][1] for symbol in symbols}
+
+    def _refresh(self, stale):
+        """Fetches quotes for stale symbols. Must be called with self._lock held
+
+        Args:
+            stale (list of str): The upper case symbols to be fetched.
+        Raises:
+            StockifyAPIError: If no quote, or no latest price, is returned for
+                a symbol.
+        """
+
+        now = time.time()
+        batch = Data.compact_quotes(stale)
+        for symbol in stale:
+            if symbol not in batch:
+                raise StockifyAPIError(f'No quote returned for {symbol}')
+            quote = batch[symbol]
+            if math.isnan(quote.latest_price):
+                raise StockifyAPIError(f'No latest price returned for {symbol}')
+            entry = self._entries.get(symbol)
+            if (entry and _same_price(entry[1].latest_price, quote.latest_price)
+                    and _same_price(entry[1].open, quote.open)):
+                quote = entry[1]
+            self._entries[symbol] = (now, quote)
+
+    def get_quote(self, symbol):
+        """Gets the quote of a single symbol, fetching it if it is stale
+
+        Args:
+            symbol (str): The stock symbol to be quoted. Not case sensitive.
+        Returns:
+            Quote: The symbol's latest and open price.
+        """
+
+        return self.get([symbol])[symbol.upper()]
+
+    def invalidate(self, symbol_list=None):
+        """Marks quotes as stale, so they are fetched on next use
+
+        Args:
+            symbol_list (list of str, optional): The symbols to invalidate.
+                Defaults to all symbols.
+        """
+
+        if symbol_list is None:
+            symbol_list = list(self._entries)
+        for symbol in symbol_list:
+            entry = self._entries.get(symbol.upper())
+            if entry:
+                self._entries[symbol.upper()] = (float('-inf'), entry[1])
+
+
+def _price(value):
+    """Converts a price from the API to a float, using NaN for missing prices"""
+
+    return float('nan') if value is None else value
+
+
+def _same_price(price, other):
+    """Compares two prices, treating two missing (NaN) prices as the same"""
+
+    return price == other or (price != price and other != other)
+
+
+class ReferenceData(object):
+    """A persistent cache of reference data: company name, sector and exchange
+
+    These fields almost never change, so they are stored on disk and only
+    fetched again once they are older than the time to live. Missing or stale
+    symbols are fetched together with `Data.batch_quote()`. Symbols the API
+    returns nothing for (e.g. delisted symbols) are cached as not found for the
+    same time to live, so they are not requested again on every run.
+
+    The default cache, used by `Data.info()`, is stored in the directory named
+    by the STOCKIFY_CACHE_DIR environment variable, or ~/.stockify.
+
+    Args:
+        filename (str, optional): The JSON file the cache is stored in.
+            Defaults to 'reference.json' in the default cache directory.
+        ttl (int, optional): The number of seconds an entry is valid for.
+            Defaults to one week.
+    """
+
+    FIELDS = ('companyName', 'sector', 'primaryExchange')
+    DEFAULT_TTL = 7 * 24 * 60 * 60
+    _default = None
+
+    def __init__(self, filename=None, ttl=DEFAULT_TTL):
+
+        if filename is None:
+            cache_dir = os.environ.get('STOCKIFY_CACHE_DIR',
+                                       os.path.join(os.path.expanduser('~'),
+                                                    '.stockify'))
+            filename = os.path.join(cache_dir, 'reference.json')
+        self.filename = filename
+        self.ttl = ttl
+        self._entries = None
+
+    @classmethod
+    def default(cls):
+        """Returns the shared cache stored in the default location
+
+        Returns:
+            ReferenceData: The default cache.
+        """
+
+        if cls._default is None:
+            cls._default = cls()
+        return cls._default
+
+    def _load(self):
+
+        self._entries = {}
+        try:
+            with open(self.filename, 'r') as cachefile:
+                self._entries = json.load(cachefile)
+        except (OSError, ValueError):
+            pass
+
+    def save(self):
+        """Writes the cache to disk
+
+        The cache is written to a temporary file that is then moved into
+        place. Failing to write it (e.g. to a read-only home directory) is not
+        an error; the cache is then only kept in memory.
+        """
+
+        temp_filename = self.filename + '.tmp'
+        try:
+            os.makedirs(os.path.dirname(self.filename) or '.', exist_ok=True)
+            with open(temp_filename, 'w') as cachefile:
+                json.dump(self._entries, cachefile)
+            os.replace(temp_filename, self.filename)
+        except OSError:
+            pass
+
+    def prefetch(self, symbol_list):
+        """Fetches reference data for all symbols that are missing or stale
+
+        Args:
+            symbol_list (list of str): The stock symbols to be fetched. Not
+                case sensitive.
+        Returns:
+            dict of dict: Key:Value pairs of 'SYMBOL':reference data, a dict of
+                the company name, sector and primary exchange, for each symbol
+                that could be found.
+        """
+
+        if self._entries is None:
+            self._load()
+        now = time.time()
+        symbols = {symbol.upper() for symbol in symbol_list}
+        stale = [symbol for symbol in symbols
+                 if symbol not in self._entries
+                 or now - self._entries[symbol]['fetched'] > self.ttl]
+        if stale:
+            quotes = Data.batch_quote(stale, fields=self.FIELDS)
+            for symbol in stale:
+                if symbol in quotes:
+                    entry = {field: quotes[symbol].get(field)
+                             for field in self.FIELDS}
+                else:
+                    entry = {'missing': True}
+                entry['fetched'] = now
+                self._entries[symbol] = entry
+            self.save()
+        return {symbol: {field: self._entries[symbol][field]
+                         for field in self.FIELDS}
+                for symbol in symbols
+                if not self._entries[symbol].get('missing')}
+
+    def get(self, symbol):
+        """Gets the reference data of a single symbol, fetching it if needed
+
+        Args:
+            symbol (str): The stock symbol. Not case sensitive.
+        Returns:
+            dict of str: The company name, sector and primary exchange.
+        Raises:
+            StockifyError: If no reference data is found for the symbol.
+        """
+
+        reference = self.prefetch([symbol])
+        if symbol.upper() not in reference:
+            raise StockifyError(f'No reference data found for {symbol}')
+        return reference[symbol.upper()]
+
+
 class HistoricalData(object):
     """Class for retrieving historical information about stocks and currencies
 
@@ -0,0 +1,276 @@
+import json
+import math
+import multiprocessing
+from .api import Data
+from .core import Portfolio
+from .errors import StockifyError
+from .journal import Journal
+
+# Errors raised by BatchEvaluator.load() for files that are not valid portfolios
+LOAD_ERRORS = (OSError, ValueError, KeyError, IndexError, TypeError,
+               StockifyError)
+
+
+def _positions(portfolio):
+    """Flattens a portfolio to the positions needed to value it
+
+    Args:
+        portfolio (Portfolio): The portfolio.
+    Returns:
+        list of tuple: (symbol, total_shares, avg_cost_basis) tuples.
+    """
+
+    return [(symbol, state.total_shares, state.avg_cost_basis)
+            for symbol, state in portfolio.snapshot().items()]
+
+
+def _load_positions(task):
+    """Loads a portfolio file and flattens it to positions, in a worker
+
+    Args:
+        task (tuple): A (key, filename) pair.
+    Returns:
+        tuple: The key, the positions (see `_positions()`) or None, and the
+            error raised while loading or None.
+    """
+
+    key, filename = task
+    try:
+        return key, _positions(BatchEvaluator.load(filename)), None
+    except LOAD_ERRORS as error:
+        return key, None, error
+
+
+def _value_positions(positions, prices):
+    """Values one portfolio, flattened to positions, against a set of prices
+
+    Gains are rounded the same way as `Holding.get_gains()` so that batch and
+    single portfolio results agree.
+
+    Args:
+        positions (list of tuple): Positions, as returned by `_positions()`.
+        prices (dict of tuple): Key:Value pairs of 'SYMBOL':(latest price,
+            open price), with NaN for missing prices.
+    Returns:
+        dict: The portfolio value and day/total gains. If any symbol had no
+            latest price, its 'value' and gains are None and the symbols are
+            listed under 'unpriced'. If only an open price was missing, the
+            'day' gains are None.
+    """
+
+    value = 0.0
+    day_gains = 0.0
+    total_gains = 0.0
+    unpriced = []
+    for symbol, shares, avg_cost_basis in positions:
+        latest_price, open_price = prices[symbol]
+        if math.isnan(latest_price):
+            unpriced.append(symbol)
+        current_value = round(latest_price * shares, 2)
+        open_value = round(open_price * shares, 2)
+        initial_value = round(shares * avg_cost_basis, 2)
+        value += shares * latest_price
+        day_gains += current_value - open_value
+        total_gains += current_value - initial_value
+    if unpriced:
+        return {'value': None, 'gains': {'day': None, 'total': None},
+                'unpriced': unpriced}
+    if math.isnan(day_gains):
+        day_gains = None
+    return {'value': value, 'gains': {'day': day_gains, 'total': total_gains}}
+
+
+class BatchEvaluator(object):
+    """Values many portfolios at once against a single snapshot of prices
+
+    Portfolio files are loaded by a pool of worker processes, each returning
+    only the (small) list of positions of the portfolios it loaded, so
+    parsing, which is most of the work, scales with the number of cores
+    rather than being bound to one by the GIL. The union of all symbols held
+    is then quoted once using `Data.batch_quote()` and the positions are
+    valued in this process, which costs less than sending them to a worker.
+
+    Use the evaluator as a context manager to keep one pool of workers for
+    several calls; otherwise a pool is started for each call.
+
+        with BatchEvaluator() as evaluator:
+            for key, result in evaluator.evaluate(['a.json', 'b.csv']):
+                print(key, result['value'], result['gains']['total'])
+
+    Args:
+        processes (int, optional): The number of worker processes. Defaults to
+            the number of CPUs. If 1, files are loaded in this process.
+        chunksize (int, optional): The number of files sent to a worker at a
+            time. Defaults to 16.
+    """
+
+    def __init__(self, processes=None, chunksize=16):
+
+        self.processes = processes or multiprocessing.cpu_count()
+        self.chunksize = chunksize
+        self._pool = None
+
+    def __enter__(self):
+
+        if self.processes > 1 and self._pool is None:
+            self._pool = multiprocessing.Pool(self.processes)
+        return self
+
+    def __exit__(self, *exc_info):
+
+        self.close()
+
+    def close(self):
+        """Stops the pool of worker processes, if one is running"""
+
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+
+    @staticmethod
+    def load(filename):
+        """Loads a portfolio file, picking the file format from its contents
+
+        Files ending in '.csv' are loaded as CSV. JSON files can either be
+        written by `Portfolio.to_file()` or be the snapshot of a journaled
+        portfolio (see `Portfolio.open_journal()`), in which case the changes
+        in its log are loaded too, without writing to the journal.
+
+        Args:
+            filename (str): A JSON or CSV portfolio file, or journal snapshot.
+        Returns:
+            Portfolio: The loaded portfolio.
+        Raises:
+            StockifyError: If a JSON file is not a portfolio or snapshot.
+        """
+
+        portfolio = Portfolio()
+        if filename.lower().endswith('.csv'):
+            portfolio.from_file(filename, file_format='csv', verbose=False)
+            return portfolio
+
+        with open(filename, 'r') as importfile:
+            import_data = json.load(importfile)
+        if isinstance(import_data, list):
+            portfolio._import_data(import_data)
+        elif (isinstance(import_data, dict) and 'sequence' in import_data
+              and 'holdings' in import_data):
+            Journal(portfolio, filename).load(read_only=True)
+        else:
+            raise StockifyError(f'{filename} is not a portfolio file or '
+                                f'journal snapshot')
+        return portfolio
+
+    def load_positions(self, filenames):
+        """Loads portfolio files in the worker processes, yielding positions
+
+        Results are streamed back in completion order, not input order.
+
+        Args:
+            filenames (dict or iterable): Portfolio filenames. If a dict, its
+                keys are used as result keys; otherwise the filenames are.
+        Yields:
+            tuple: A (key, positions, error) tuple. Positions is a list of
+                (symbol, total_shares, avg_cost_basis) tuples, or None if the
+                file could not be loaded, in which case error is the exception
+                raised (see `LOAD_ERRORS`) and is otherwise None.
+        """
+
+        if isinstance(filenames, dict):
+            tasks = filenames.items()
+        else:
+            tasks = ((filename, filename) for filename in filenames)
+
+        if self.processes == 1:
+            for task in tasks:
+                yield _load_positions(task)
+        elif self._pool is not None:
+            yield from self._pool.imap_unordered(_load_positions, tasks,
+                                                 chunksize=self.chunksize)
+        else:
+            with multiprocessing.Pool(self.processes) as pool:
+                yield from pool.imap_unordered(_load_positions, tasks,
+                                               chunksize=self.chunksize)
+
+    @staticmethod
+    def value_positions(portfolio_positions, quotes):
+        """Values portfolios that have been flattened to positions
+
+        Args:
+            portfolio_positions (dict of list): Key:Value pairs of key:positions,
+                as yielded by `.load_positions()`.
+            quotes (dict of quotes): A 'SYMBOL':quote dict, as returned by
+                `Data.batch_quote()`, to value the portfolios against.
+        Yields:
+            tuple: A (key, result) pair. See `.evaluate()` for the result.
+        """
+
+        prices = {}
+        for key, positions in portfolio_positions.items():
+            for symbol, _, _ in positions:
+                if symbol not in prices:
+                    quote = quotes.get(symbol) or {}
+                    latest_price = quote.get('latestPrice')
+                    open_price = quote.get('open')
+                    prices[symbol] = (
+                        float('nan') if latest_price is None else latest_price,
+                        float('nan') if open_price is None else open_price)
+            yield key, _value_positions(positions, prices)
+
+    def evaluate(self, portfolios, quotes=None):
+        """Values each portfolio, yielding results as they are completed
+
+        Results are streamed back in completion order, not input order, so
+        each is paired with the key of the portfolio it belongs to. Portfolios
+        holding a symbol without a quote have a value and gains of None, and
+        list those symbols under 'unpriced'.
+
+        Args:
+            portfolios (dict or iterable): Portfolios, or portfolio filenames,
+                to be valued. If a dict, its keys are used as result keys;
+                otherwise filenames are used as keys for files and the position
+                in the iterable for Portfolio objects.
+            quotes (dict of quotes, optional): A 'SYMBOL':quote dict, as
+                returned by `Data.batch_quote()`, to value the portfolios
+                against. If omitted the quotes are fetched once every file has
+                been loaded; if given, each portfolio is valued as soon as it
+                is loaded.
+        Yields:
+            tuple: A (key, result) pair, where result is a dict of the
+                portfolio 'value' and its 'gains', a dict of 'day' and 'total'
+                gains. Day gains are None if an open price is missing.
+        Raises:
+            Exception: One of `LOAD_ERRORS`, if a file could not be loaded.
+        """
+
+        if isinstance(portfolios, dict):
+            items = portfolios.items()
+        else:
+            items = ((item if isinstance(item, str) else index, item)
+                     for index, item in enumerate(portfolios))
+
+        loaded = {}
+        filenames = {}
+        for key, portfolio in items:
+            if isinstance(portfolio, str):
+                filenames[key] = portfolio
+            else:
+                loaded[key] = _positions(portfolio)
+
+        if quotes is not None:
+            yield from self.value_positions(loaded, quotes)
+            for key, positions, error in self.load_positions(filenames):
+                if error is not None:
+                    raise error
+                yield from self.value_positions({key: positions}, quotes)
+            return
+
+        for key, positions, error in self.load_positions(filenames):
+            if error is not None:
+                raise error
+            loaded[key] = positions
+        symbols = {symbol for positions in loaded.values()
+                   for symbol, _, _ in positions}
+        quotes = Data.batch_quote(list(symbols), fields=['latestPrice', 'open'])
+        yield from self.value_positions(loaded, quotes)
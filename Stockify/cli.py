@@ -0,0 +1,133 @@
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+from itertools import islice
+from .api import Data
+from .batch import BatchEvaluator
+
+# Portfolio file extensions picked up when a directory is given
+FILE_EXTENSIONS = ('.json', '.csv')
+
+
+def iter_files(paths):
+    """Lazily lists the portfolio files in directories or glob patterns
+
+    Args:
+        paths (list of str): Directories, files, or glob patterns. Directories
+            are searched (non-recursively) for JSON and CSV files.
+    Yields:
+        str: Portfolio filenames.
+    """
+
+    for path in paths:
+        if os.path.isdir(path):
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    if (entry.is_file() and
+                            entry.name.lower().endswith(FILE_EXTENSIONS)):
+                        yield entry.path
+        else:
+            yield from glob.iglob(path)
+
+
+def _parse_args(argv):
+
+    parser = argparse.ArgumentParser(
+        prog='stockify',
+        description=('Value portfolio files in parallel, writing one JSON '
+                     'result per line as each portfolio is valued.'))
+    parser.add_argument('paths', nargs='+',
+                        help='directories, files or glob patterns of JSON or '
+                             'CSV portfolio files')
+    parser.add_argument('-o', '--output', default='-',
+                        help='file to write JSON-lines results to (default: '
+                             'stdout)')
+    parser.add_argument('-p', '--processes', type=int, default=None,
+                        help='number of worker processes (default: number of '
+                             'CPUs)')
+    parser.add_argument('-c', '--chunk-size', type=int, default=1000,
+                        help='number of files loaded and valued at a time '
+                             '(default: 1000)')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """Runs the `stockify` batch valuation command
+
+    Files are loaded a chunk at a time by one pool of worker processes kept
+    for the whole run, so memory use does not grow with the number of files. Quotes are shared across chunks: each symbol is only
+    fetched the first time it is held, with one batch request per 100 new
+    symbols. Files that cannot be loaded, and portfolios holding a symbol
+    without a quote, are written as error records and counted as failed.
+
+    Args:
+        argv (list of str, optional): Command line arguments. Defaults to
+            sys.argv[1:].
+    Returns:
+        int: The exit status, 1 if any portfolio could not be valued.
+    """
+
+    args = _parse_args(argv)
+    outfile = (sys.stdout if args.output == '-'
+               else open(args.output, 'w'))
+
+    start_time = time.time()
+    start_requests = Data.request_count
+    quotes = {}
+    valued = 0
+    failed = 0
+    files = iter_files(args.paths)
+    try:
+        with BatchEvaluator(processes=args.processes) as evaluator:
+            while True:
+                chunk = list(islice(files, args.chunk_size))
+                if not chunk:
+                    break
+
+                loaded = {}
+                for filename, positions, error in evaluator.load_positions(
+                        chunk):
+                    if error is not None:
+                        failed += 1
+                        outfile.write(json.dumps({'file': filename,
+                                                  'error': str(error)}) + '\n')
+                    else:
+                        loaded[filename] = positions
+
+                symbols = {symbol for positions in loaded.values()
+                           for symbol, _, _ in positions}
+                missing = [symbol for symbol in symbols if symbol not in quotes]
+                if missing:
+                    quotes.update(Data.batch_quote(
+                        missing, fields=['latestPrice', 'open']))
+
+                for filename, result in evaluator.value_positions(loaded,
+                                                                  quotes):
+                    record = {'file': filename}
+                    if 'unpriced' in result:
+                        failed += 1
+                        record['error'] = (f'No quote available for '
+                                           f'{", ".join(result["unpriced"])}')
+                    else:
+                        valued += 1
+                        record.update(result)
+                    outfile.write(json.dumps(record, allow_nan=False) + '\n')
+                    outfile.flush()
+    finally:
+        if outfile is not sys.stdout:
+            outfile.close()
+
+    elapsed = time.time() - start_time
+    rate = valued / elapsed if elapsed else 0.0
+    print((f'{valued} portfolios valued in {elapsed:.2f}s '
+           f'({rate:.1f}/s), {failed} failed, '
+           f'{Data.request_count - start_requests} API requests'),
+          file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,8 +1,19 @@
 from datetime import datetime
+from bisect import bisect_left, bisect_right
+from collections import namedtuple
+import heapq
+import math
+import threading
 import json
 import csv
-from .api import Data
+from .api import Data, QuoteCache, ReferenceData
 from .errors import StockifyError
+from .journal import Journal
+
+# An immutable snapshot of a Holding. Lots and dates are parallel tuples in
+# date order; version is incremented on every change to the holding.
+HoldingState = namedtuple('HoldingState', ['lots', 'dates', 'total_shares',
+                                           'avg_cost_basis', 'version'])
 
 
 class Portfolio(object):
@@ -15,6 +26,12 @@ class Portfolio(object):
         `portfolio.add_holding('aapl')`
         # Access
         `portfolio['aapl']`
+
+    Portfolios are safe to share between threads. Adding or removing a
+    holding replaces the `holdings` dict with an updated copy rather than
+    changing it in place, so readers can iterate over it without a lock.
+    Use `.snapshot()` to read the state of every holding at once.
+
     Args:
         holdings (list of str, optional): A list of symbols to be added as
             holdings to the portfolio.
@@ -22,6 +39,11 @@ class Portfolio(object):
 
     def __init__(self, holdings=None):
         self.holdings = {}
+        self._date_index = None
+        self._journal = None
+        self._lock = threading.Lock()
+        # (holdings, holding valuations, totals) of the last valuation
+        self._valuation = None
         if holdings:
             self.add_holdings(holdings)
 
@@ -32,18 +54,74 @@ class Portfolio(object):
             symbol (str): The stock symbol to add as a holding
         """
 
-        holding = Holding(symbol)
-        self.holdings[symbol.upper()] = holding
+        self.add_holdings([symbol])
 
     def add_holdings(self, symbol_list):
         """Add  a list of holdings passed in as a list of symbols.
 
+        The holdings dict is copied and replaced once for the whole list, so
+        adding many holdings at once is much faster than one at a time.
+
         Args:
             symbol_list (list of str): A list of stock symbols to add as holdings
         """
 
-        for symbol in symbol_list:
-            self.add_holding(symbol)
+        new_holdings = [Holding(symbol) for symbol in symbol_list]
+        with self._lock:
+            holdings = dict(self.holdings)
+            dropped = []
+            for holding in new_holdings:
+                holding._journal = self._journal
+                replaced = holdings.get(holding.symbol)
+                if replaced is not None:
+                    dropped.append(replaced)
+                holdings[holding.symbol] = holding
+            self._publish(holdings, [('add_holding', {'symbol': holding.symbol})
+                                     for holding in new_holdings], dropped)
+
+    def snapshot(self):
+        """Returns a consistent snapshot of every holding, without locking
+
+        Returns:
+            dict of {str: HoldingState}: Key:Value pairs of 'SYMBOL':state.
+                See `Holding.snapshot()` for more detail.
+        """
+
+        return {symbol: holding.snapshot()
+                for symbol, holding in self.holdings.items()}
+
+    def _valuate(self):
+        """Values every holding, reusing results that are still valid
+
+        All stale quotes are fetched at once from the default QuoteCache. Each
+        holding only recalculates if its lots or its quote changed, and the
+        totals are only summed again if any holding did.
+
+        Returns:
+            tuple: The holdings dict valued, a tuple of the (value, day gains,
+                total gains) of each holding, and a tuple of the portfolio
+                totals.
+        """
+
+        holdings = self.holdings
+        quotes = QuoteCache.default().get(list(holdings))
+        results = tuple(holding._valuate(quotes[symbol])
+                        for symbol, holding in holdings.items())
+        valuation = self._valuation
+        if (valuation is None or valuation[0] is not holdings or
+                any(new is not old for new, old in zip(results, valuation[1]))):
+            value = 0
+            day_gains = 0
+            total_gains = 0
+            for holding_value, holding_day, holding_total in results:
+                value += holding_value
+                if day_gains is not None:
+                    day_gains = (None if holding_day is None
+                                 else day_gains + holding_day)
+                total_gains += holding_total
+            valuation = (holdings, results, (value, day_gains, total_gains))
+            self._valuation = valuation
+        return valuation
 
     def get_value(self, symbol=None):
         """Gets the value of a single symbol or the entire portfolio.
@@ -59,28 +137,81 @@ class Portfolio(object):
         if symbol:
             return self.holdings[symbol.upper()].get_value()
         else:
-            value = 0
-            for holding in self.holdings.values():
-                value += holding.get_value()
-            return value
+            return self._valuate()[2][0]
 
     def get_gains(self, symbol=None):
 
         if symbol:
             return self.holdings[symbol.upper()].get_gains()
         else:
-            total_gains = 0
-            day_gains = 0
-            return_list = []
-            for symbol, holding in self.holdings.items():
-                holding_gains = holding.get_gains()
-                day_gains += holding_gains['day']
-                total_gains += holding_gains['total']
-                return_list.append({symbol: holding_gains})
-            total = {'total': {'day': day_gains, 'total': total_gains}}
+            holdings, results, totals = self._valuate()
+            return_list = [{symbol: {'day': result[1], 'total': result[2]}}
+                           for symbol, result in zip(holdings, results)]
+            total = {'total': {'day': totals[1], 'total': totals[2]}}
             return_list.append(total)
             return return_list
 
+    def prefetch_reference(self, reference_data=None):
+        """Fetches reference data for all holdings that is missing or stale
+
+        Args:
+            reference_data (ReferenceData, optional): The cache to use.
+                Defaults to the shared default cache.
+        Returns:
+            dict of dict: Key:Value pairs of 'SYMBOL':reference data. See
+                `ReferenceData.prefetch()` for more detail.
+        """
+
+        reference_data = reference_data or ReferenceData.default()
+        return reference_data.prefetch(list(self.holdings))
+
+    def get_exposure(self, by='sector', quotes=None, reference_data=None):
+        """Breaks the value of the portfolio down by sector or exchange
+
+        All holdings are valued against one snapshot of quotes, and sectors and
+        exchanges are read from the reference data cache, so static metadata
+        is not downloaded again on every call.
+
+        Args:
+            by (str, optional): 'sector' or 'exchange'. Defaults to 'sector'.
+            quotes (dict of quotes, optional): A 'SYMBOL':quote dict, as
+                returned by `Data.batch_quote()`. If omitted the quotes are
+                fetched.
+            reference_data (ReferenceData, optional): The cache to use.
+                Defaults to the shared default cache.
+        Returns:
+            dict of {str: dict}: Key:Value pairs of group:exposure, where the
+                exposure is a dict of the USD 'value' of the holdings in that
+                group and their 'weight' as a fraction of the portfolio value.
+                Holdings without a sector or exchange are grouped as 'Unknown'.
+        Raises:
+            StockifyError: If `by` is not a supported value, or a holding's
+                symbol has no quote or latest price.
+        """
+
+        fields = {'sector': 'sector', 'exchange': 'primaryExchange'}
+        if by not in fields:
+            raise StockifyError(f'{by} is not a supported exposure grouping')
+
+        reference = self.prefetch_reference(reference_data)
+        if quotes is None:
+            quotes = Data.batch_quote(list(self.holdings),
+                                      fields=['latestPrice'])
+
+        group_values = {}
+        for symbol, state in self.snapshot().items():
+            latest_price = (quotes.get(symbol) or {}).get('latestPrice')
+            if latest_price is None:
+                raise StockifyError(f'No quote available for {symbol}')
+            group = reference.get(symbol, {}).get(fields[by]) or 'Unknown'
+            value = state.total_shares * latest_price
+            group_values[group] = group_values.get(group, 0) + value
+
+        total_value = sum(group_values.values())
+        return {group: {'value': value,
+                        'weight': value / total_value if total_value else 0.0}
+                for group, value in group_values.items()}
+
     def get_prices(self):
         """Gets the current stock price of the holdings in the portfolio.
 
@@ -89,9 +220,107 @@ class Portfolio(object):
                 symbol: price dict.
         """
 
-        return [{symbol: Data.price(symbol)} for symbol, _
+        quotes = QuoteCache.default().get(list(self.holdings))
+        return [{symbol: quotes[symbol].latest_price} for symbol, _
                 in self.holdings.items()]
 
+    def _get_date_index(self):
+        """Returns the global date index, rebuilding it if any holding changed
+
+        The index is a pair of parallel tuples, the dates and lots of every
+        holding in date order. It is built from a snapshot of the holdings and
+        is only rebuilt once any holding's state has been replaced, i.e. after
+        lots or holdings are added or removed.
+
+        Returns:
+            tuple of (tuple of date, tuple of Lot): The sorted dates and lots.
+        """
+
+        states = self.snapshot()
+        date_index = self._date_index
+        if (date_index is None or len(date_index[0]) != len(states) or
+                any(date_index[0].get(symbol) is not state
+                    for symbol, state in states.items())):
+            lots = tuple(heapq.merge(*[state.lots for state
+                                       in states.values()],
+                                     key=lambda lot: lot.date))
+            dates = tuple(lot.date for lot in lots)
+            date_index = (states, dates, lots)
+            self._date_index = date_index
+        return date_index[1], date_index[2]
+
+    def query_lots(self, start=None, end=None, symbols=None, gain_above=None,
+                   gain_below=None, quotes=None):
+        """Finds the lots bought in a date range, optionally filtered by gains
+
+        Date ranges are looked up by bisecting sorted date indexes, so the cost
+        grows with the number of lots returned rather than the number held.
+        Gain filters are evaluated against a single snapshot of quotes, one
+        per symbol, rather than a quote per lot. For example, all lots bought
+        in the first half of 2018 that are currently under water:
+            `portfolio.query_lots('2018-01-01', '2018-06-30', gain_below=0)`
+
+        Args:
+            start (str or date, optional): The earliest lot date, inclusive,
+                as a date or in 'YYYY-MM-DD' format. Unbounded if omitted.
+            end (str or date, optional): The latest lot date, inclusive.
+                Unbounded if omitted.
+            symbols (list of str, optional): Only return lots of these
+                holdings. Defaults to all holdings.
+            gain_above (float, optional): Only return lots whose total gains,
+                in USD, are greater than this.
+            gain_below (float, optional): Only return lots whose total gains,
+                in USD, are less than this.
+            quotes (dict of quotes, optional): A 'SYMBOL':quote dict, as
+                returned by `Data.batch_quote()`, used for the gain filters. If
+                omitted the quotes are fetched.
+        Returns:
+            LotView: A read-only view of the matching lots, in date order when
+                `symbols` is omitted and by holding otherwise.
+        Raises:
+            StockifyError: If a gain filter is used and a lot's symbol has no
+                quote or latest price.
+        """
+
+        if symbols is None:
+            dates, lots = self._get_date_index()
+            low, high = _date_range(dates, start, end)
+            view = LotView([(lots, range(low, high))])
+        else:
+            segments = []
+            for symbol in symbols:
+                segments.extend(self[symbol].query_lots(start, end)._segments)
+            view = LotView(segments)
+
+        if gain_above is None and gain_below is None:
+            return view
+
+        if quotes is None:
+            quotes = Data.batch_quote({lot.symbol for lot in view},
+                                      fields=['latestPrice'])
+        prices = {}
+        segments = []
+        for lots, indexes in view._segments:
+            matches = []
+            for index in indexes:
+                lot = lots[index]
+                if lot.symbol not in prices:
+                    latest_price = (quotes.get(lot.symbol) or
+                                    {}).get('latestPrice')
+                    if latest_price is None:
+                        raise StockifyError(f'No quote available for '
+                                            f'{lot.symbol}')
+                    prices[lot.symbol] = latest_price
+                market_value = round(lot.shares * prices[lot.symbol], 2)
+                gains = round(market_value - lot.initial_value, 2)
+                if gain_above is not None and gains <= gain_above:
+                    continue
+                if gain_below is not None and gains >= gain_below:
+                    continue
+                matches.append(index)
+            segments.append((lots, matches))
+        return LotView(segments)
+
     def remove(self, holding_symbol):
         """Remove a holding
 
@@ -99,7 +328,139 @@ class Portfolio(object):
             holding_symbol (str): The symbol to be removed
         """
 
-        self.holdings.pop(holding_symbol.upper())
+        with self._lock:
+            holdings = dict(self.holdings)
+            removed = holdings.pop(holding_symbol.upper())
+            self._publish(holdings, [('remove_holding',
+                                      {'symbol': holding_symbol.upper()})],
+                          [removed])
+
+    def _publish(self, holdings, records, dropped=()):
+        """Replaces the holdings dict and records the change in the journal
+
+        Holdings that are no longer part of the portfolio are detached from
+        the journal, so later changes to them are not recorded. Must be called
+        with self._lock held.
+
+        Args:
+            holdings (dict of {str: Holding}): The new holdings.
+            records (list of tuple): (operation, fields) pairs of the journal
+                operations that make up the change, see `Journal.record()`.
+            dropped (list of Holding, optional): Holdings removed or replaced
+                by the change.
+        """
+
+        journal = self._journal
+        if journal:
+            with journal.lock:
+                self.holdings = holdings
+                for holding in dropped:
+                    holding._journal = None
+                for operation, fields in records:
+                    journal.record(operation, **fields)
+                journal.maybe_compact()
+        else:
+            self.holdings = holdings
+
+    def open_journal(self, filename, sync_every=100, compact_every=None):
+        """Loads the portfolio from a journal and records all later changes
+
+        In journaled mode the portfolio is stored as a snapshot plus a log of
+        changes. Adding or removing holdings and lots appends a small record
+        to the log instead of rewriting the whole portfolio, so the cost of
+        saving grows with the size of the change. Call `.compact()` to fold
+        the log into a new snapshot.
+
+        Args:
+            filename (str): The snapshot filename. The log is stored next to it
+                with a '.log' extension appended. Neither has to exist yet.
+            sync_every (int, optional): Records are flushed to disk with fsync
+                after this many changes. Defaults to 100; use 1 to sync every
+                change.
+            compact_every (int, optional): If specified, the log is compacted
+                automatically once it holds this many records.
+        Returns:
+            Journal: The journal attached to this portfolio.
+        Raises:
+            StockifyError: If the portfolio already has holdings or a journal.
+        """
+
+        if self._journal:
+            raise StockifyError('Portfolio already has an open journal')
+        if self.holdings:
+            raise StockifyError(('A journal can only be opened on a portfolio '
+                                 'with no holdings'))
+        journal = Journal(self, filename, sync_every=sync_every,
+                          compact_every=compact_every)
+        journal.load()
+        self._journal = journal
+        for holding in self.holdings.values():
+            holding._journal = journal
+        return journal
+
+    def compact(self):
+        """Folds the journal's log of changes into a new snapshot
+
+        Raises:
+            StockifyError: If no journal is open.
+        """
+
+        if not self._journal:
+            raise StockifyError('Portfolio has no open journal')
+        self._journal.compact()
+
+    def close_journal(self):
+        """Syncs and closes the journal, leaving the portfolio unjournaled"""
+
+        if self._journal:
+            self._journal.close()
+            self._journal = None
+            for holding in self.holdings.values():
+                holding._journal = None
+
+    def _export_data(self):
+        """Formats the holdings and lots as JSON-serializable data
+
+        Returns:
+            list of dict: One dict per holding, with its symbol and lots.
+        """
+
+        date_format = '%Y-%m-%d'
+        export_data = []
+        for symbol, holding in self.holdings.items():
+            holding_data = {'symbol': symbol,
+                            'lots': []}
+            for lot in holding.lots:
+                lot_data = {'date': lot.date.strftime(date_format),
+                            'cost_basis': lot.cost_basis,
+                            'shares': lot.shares}
+                holding_data['lots'].append(lot_data)
+            export_data.append(holding_data)
+        return export_data
+
+    def _import_data(self, import_data):
+        """Adds holdings and lots formatted as by `._export_data()`
+
+        Args:
+            import_data (list of dict): One dict per holding, with its symbol
+                and lots.
+        Returns:
+            tuple of int: The number of holdings and lots added.
+        """
+
+        holding_count = 0
+        lot_count = 0
+        self.add_holdings([holding['symbol'] for holding in import_data])
+        for holding in import_data:
+            holding_count += 1
+            this_holding = self.__getitem__(holding['symbol'])
+            lot_data = holding['lots']
+            lot_list = [[lot['date'], lot['cost_basis'], lot['shares']]
+                        for lot
+                        in lot_data]
+            this_holding.add_lots(lot_list)
+            lot_count += len(holding['lots'])
+        return holding_count, lot_count
 
     def to_file(self, filename, file_format='json'):
         """Save the current portfolio to disk as a JSON or CSV file
@@ -115,16 +476,7 @@ class Portfolio(object):
             raise StockifyError('Cannot export a portfolio with no holdings')
 
         if file_format == 'json':
-            export_data = []
-            for symbol, holding in self.holdings.items():
-                holding_data = {'symbol': symbol,
-                                'lots': []}
-                for lot in holding.lots:
-                    lot_data = {'date': lot.date.strftime(date_format),
-                                'cost_basis': lot.cost_basis,
-                                'shares': lot.shares}
-                    holding_data['lots'].append(lot_data)
-                export_data.append(holding_data)
+            export_data = self._export_data()
             with open(filename, 'w') as outfile:
                 json.dump(export_data, outfile)
                 print(f'Portfolio written to file: {filename}')
@@ -149,7 +501,7 @@ class Portfolio(object):
         else:
             raise StockifyError(f'{format} is not a supported file format.')
 
-    def from_file(self, filename, file_format='json'):
+    def from_file(self, filename, file_format='json', verbose=True):
         """Loads holdings and lots from disk.
 
         Holdings/lots that have already been added to the current portfolio
@@ -160,44 +512,41 @@ class Portfolio(object):
             filename (str): The name of the file to load, including extension
             format (str, optional): The format of the file. Defaults to 'json'.
                 'json' and 'csv' are supported.
+            verbose (bool, optional): Print a summary of what was loaded.
+                Defaults to True.
         """
 
         if file_format == 'json':
             with open(filename, 'r') as importfile:
                 import_data = json.load(importfile)
-                holding_count = 0
-                lot_count = 0
-                for holding in import_data:
-                    holding_count += 1
-                    self.add_holding(holding['symbol'])
-                    this_holding = self.__getitem__(holding['symbol'])
-                    lot_data = holding['lots']
-                    lot_list = [[lot['date'], lot['cost_basis'], lot['shares']]
-                                for lot
-                                in lot_data]
-                    this_holding.add_lots(lot_list)
-                    lot_count += len(holding['lots'])
-                print((f'{holding_count} holdings and {lot_count} lots '
-                       'loaded from file'))
+                holding_count, lot_count = self._import_data(import_data)
+                if verbose:
+                    print((f'{holding_count} holdings and {lot_count} lots '
+                           'loaded from file'))
         elif file_format == 'csv':
             with open(filename, 'r', newline='') as importfile:
                 reader = csv.reader(importfile)
                 next(reader) # Skip the header row
-                holding_count = 0
                 lot_count = 0
+                # Group lots by holding, so each holding is only updated once
+                lot_lists = {}
                 for row in reader:
                     if len(row) > 4:
                         raise StockifyError(('Unexpected number of columns '
                                              'encountered in row.'))
 
-                    if row[0] not in self.holdings.keys():
-                        self.add_holding(row[0])
-                        holding_count += 1
-                    holding = self.holdings[row[0]]
-                    holding.add_lot(row[1], float(row[2]), int(row[3]))
+                    lot_list = lot_lists.setdefault(row[0].upper(), [])
+                    lot_list.append([row[1], float(row[2]), int(row[3])])
                     lot_count += 1
-                print((f'{holding_count} holdings and {lot_count} lots '
-                       'loaded from file'))
+                new_symbols = [symbol for symbol in lot_lists
+                               if symbol not in self.holdings]
+                self.add_holdings(new_symbols)
+                holding_count = len(new_symbols)
+                for symbol, lot_list in lot_lists.items():
+                    self.holdings[symbol].add_lots(lot_list)
+                if verbose:
+                    print((f'{holding_count} holdings and {lot_count} lots '
+                           'loaded from file'))
         else:
             raise StockifyError(f'{format} is not a supported file format.')
 
@@ -227,36 +576,105 @@ class Holding(object):
     The `.get_value()` method returns the total value of the lots comprising
     the holding.
 
+    Values and gains are memoized, and only recalculated once lots are added
+    or removed or the quote of the holding's symbol changes. Quotes come from
+    the default QuoteCache, so the network is only used for stale quotes.
+
+    Holdings are safe to share between threads. Lots and totals are stored in
+    an immutable HoldingState that writers replace as a whole (copy-on-write),
+    so readers never need a lock and always see lots and totals that agree.
+
     Args:
         symbol (str): The stock symbol of the holding.
 
     Attributes:
-        lots (list of Lots): A list of the lots comprising this holding. Added
-            via `.add_lot()` method.
+        lots (tuple of Lots): The lots comprising this holding, in date order.
+            Added via `.add_lot()` method.
+        total_shares (float): The total shares of all lots.
+        avg_cost_basis (float): The average cost-per-share of all lots.
     """
 
     def __init__(self, symbol):
 
-        self.lots = []
         self.symbol = symbol.upper()
-        self.total_shares = 0
-        self.avg_cost_basis = 0.0
+        self._state = HoldingState((), (), 0, 0.0, 0)
+        self._lock = threading.Lock()
+        self._journal = None
+        # (state, quote, (value, day gains, total gains)) of the last valuation
+        self._valuation = None
+
+    @property
+    def lots(self):
 
-    def _calc_avg_cost_basis(self):
+        return self._state.lots
+
+    @property
+    def total_shares(self):
+
+        return self._state.total_shares
+
+    @property
+    def avg_cost_basis(self):
+
+        return self._state.avg_cost_basis
+
+    def snapshot(self):
+        """Returns a consistent, immutable snapshot of the holding
+
+        Returns:
+            HoldingState: The lots, lot dates, total shares, average cost
+                basis, and version (incremented on every change) of the
+                holding.
+        """
+
+        return self._state
+
+    @staticmethod
+    def _calc_avg_cost_basis(lots):
 
         avg_cost_basis = 0.0
         total_shares = 0
-        number_of_lots = len(self.lots)
+        number_of_lots = len(lots)
         if number_of_lots > 0:
-            for lot in self.lots:
+            for lot in lots:
                 lot_cost_basis = lot.cost_basis * lot.shares
                 avg_cost_basis += lot_cost_basis
                 total_shares += lot.shares
             avg_cost_basis = avg_cost_basis / total_shares
         return avg_cost_basis
 
+    def _publish(self, state, lots, dates, records):
+        """Replaces the state with one for a changed tuple of lots
+
+        The change is recorded in the journal, if there is one. Must be called
+        with self._lock held.
+
+        Args:
+            state (HoldingState): The state the change was made to.
+            lots (tuple of Lots): The new lots, in date order.
+            dates (tuple of date): The dates of the new lots.
+            records (list of tuple): (operation, fields) pairs of the journal
+                operations that make up the change, see `Journal.record()`.
+        """
+
+        total_shares = sum(lot.shares for lot in lots)
+        new_state = HoldingState(lots, dates, total_shares,
+                                 self._calc_avg_cost_basis(lots),
+                                 state.version + 1)
+        journal = self._journal
+        if journal:
+            with journal.lock:
+                self._state = new_state
+                # The holding may have been removed from the portfolio since
+                if self._journal is journal:
+                    for operation, fields in records:
+                        journal.record(operation, symbol=self.symbol, **fields)
+                    journal.maybe_compact()
+        else:
+            self._state = new_state
+
     def add_lot(self, date, cost_basis, shares):
-        """Creates a Lot object and appends it to the self.lots attribute
+        """Creates a Lot object and adds it to the self.lots attribute
 
         Args:
             date (str): The date of the lot in the following format: 'YYYY-MM-DD'
@@ -265,23 +683,73 @@ class Holding(object):
         """
 
         lot = Lot(self.symbol, date, cost_basis, shares)
-        self.lots.append(lot)
-        self.lots.sort()
-        # Update holding totals
-        self.total_shares += shares
-        self.avg_cost_basis = self._calc_avg_cost_basis()
+        with self._lock:
+            state = self._state
+            # Insert after any lots of the same date, as a stable sort would
+            index = bisect_right(state.dates, lot.date)
+            lots = state.lots[:index] + (lot,) + state.lots[index:]
+            dates = state.dates[:index] + (lot.date,) + state.dates[index:]
+            self._publish(state, lots, dates,
+                          [('add_lot', {'date': date, 'cost_basis': cost_basis,
+                                        'shares': shares})])
 
     def add_lots(self, lot_list):
         """Create multiple lots passed in as a list
 
+        The lots are merged into the holding in one pass and a single new state
+        is published, so adding many lots at once is much faster than one at a
+        time.
+
         Args:
             lot_list (list of of lists): A list of lists, where each list item
                 contains the three parameters needed to create a lot: date,
                 cost basis, and shares, in that exact order.
         """
 
-        for lot in lot_list:
-            self.add_lot(lot[0], lot[1], lot[2])
+        new_lots = [Lot(self.symbol, lot[0], lot[1], lot[2])
+                    for lot in lot_list]
+        with self._lock:
+            state = self._state
+            # A stable sort keeps lots of the same date in the order added, as
+            # repeated calls to .add_lot() would
+            lots = tuple(sorted(state.lots + tuple(new_lots),
+                                key=lambda lot: lot.date))
+            dates = tuple(lot.date for lot in lots)
+            self._publish(state, lots, dates,
+                          [('add_lot', {'date': lot[0], 'cost_basis': lot[1],
+                                        'shares': lot[2]})
+                           for lot in lot_list])
+
+    def _valuate(self, quote):
+        """Values the holding, reusing the last result if it is still valid
+
+        The last result is only valid while both the state (i.e. the lots) and
+        the quote are the same objects it was calculated from.
+
+        Args:
+            quote (Quote): The current quote of the holding's symbol.
+        Returns:
+            tuple of float: The USD value, day gains, and total gains. Day
+                gains are None if the quote has no open price.
+        """
+
+        state = self._state
+        valuation = self._valuation
+        if (valuation is not None and valuation[0] is state and
+                valuation[1] is quote):
+            return valuation[2]
+        current_value = round(quote.latest_price * state.total_shares, 2)
+        initial_value = round(state.total_shares * state.avg_cost_basis, 2)
+        if math.isnan(quote.open):
+            day_gains = None
+        else:
+            day_gains = (current_value -
+                         round(quote.open * state.total_shares, 2))
+        result = (state.total_shares * quote.latest_price,
+                  day_gains,
+                  current_value - initial_value)
+        self._valuation = (state, quote, result)
+        return result
 
     def get_value(self):
         """Calculates the total value of the holding, based on value of lots
@@ -291,7 +759,7 @@ class Holding(object):
                 have been added.
         """
 
-        return self.total_shares * Data.price(self.symbol)
+        return self._valuate(QuoteCache.default().get_quote(self.symbol))[0]
 
     def get_price(self):
         """The current market price of a single share of the holding.
@@ -300,20 +768,17 @@ class Holding(object):
             float: The current USD share price of the holding.
         """
 
-        return Data.price(self.symbol)
+        return QuoteCache.default().get_quote(self.symbol).latest_price
 
     def get_gains(self):
         """The day and total gains of this holding since
 
         Returns:
-            dict of {str: float}: The day and total gains for this holding
-        """
-        quote = Data.quote(self.symbol)
-        current_value = round(quote['latestPrice'] * self.total_shares, 2)
-        open_value = round(quote['open'] * self.total_shares, 2)
-        initial_value = round(self.total_shares * self.avg_cost_basis, 2)
-        day_gains = current_value - open_value
-        total_gains = current_value - initial_value
+            dict of {str: float}: The day and total gains for this holding.
+                Day gains are None if the quote has no open price.
+        """
+        _, day_gains, total_gains = self._valuate(
+            QuoteCache.default().get_quote(self.symbol))
         return {'day': day_gains, 'total': total_gains}
 
     def remove(self, lot_index):
@@ -323,7 +788,30 @@ class Holding(object):
             lot_index: The index number of the lot to be removed
         """
 
-        del self.lots[lot_index]
+        with self._lock:
+            state = self._state
+            lots = list(state.lots)
+            dates = list(state.dates)
+            del lots[lot_index]
+            del dates[lot_index]
+            self._publish(state, tuple(lots), tuple(dates),
+                          [('remove_lot', {'index': lot_index})])
+
+    def query_lots(self, start=None, end=None):
+        """Finds the lots of this holding bought in a date range
+
+        Args:
+            start (str or date, optional): The earliest lot date, inclusive,
+                as a date or in 'YYYY-MM-DD' format. Unbounded if omitted.
+            end (str or date, optional): The latest lot date, inclusive.
+                Unbounded if omitted.
+        Returns:
+            LotView: A read-only view of the matching lots, in date order.
+        """
+
+        state = self._state
+        low, high = _date_range(state.dates, start, end)
+        return LotView([(state.lots, range(low, high))])
 
     def __getitem__(self, item):
 
@@ -335,14 +823,15 @@ class Holding(object):
 
     def __repr__(self):
 
-        return f'Holding: {self.symbol}; Lots: {self.lots}'
+        return f'Holding: {self.symbol}; Lots: {list(self.lots)}'
 
 
 class Lot(object):
     """An object to store a lot, a group of shares purchased in a transaction
 
     Lots store the basic information about cost basis and shares that allow for
-    total value of a holding to be calculated.
+    total value of a holding to be calculated. Values and gains are memoized
+    and only recalculated when the quote of the lot's symbol changes.
 
     Args:
         symbol (str): the stock symbol of the lot
@@ -360,6 +849,30 @@ class Lot(object):
         self.cost_basis = cost_basis
         self.shares = shares
         self.initial_value = round(shares * cost_basis, 2)
+        # (quote, (market value, day gains, total gains)) of the last valuation
+        self._valuation = None
+
+    def _valuate(self):
+        """Values the lot, reusing the last result while the quote is unchanged
+
+        Returns:
+            tuple of float: The USD market value, day gains, and total gains.
+        """
+
+        quote = QuoteCache.default().get_quote(self.symbol)
+        valuation = self._valuation
+        if valuation is not None and valuation[0] is quote:
+            return valuation[1]
+        market_value = round(self.shares * quote.latest_price, 2)
+        if math.isnan(quote.open):
+            day_gains = None
+        else:
+            day_gains = round((quote.latest_price * self.shares) -
+                              (quote.open * self.shares), 2)
+        total_gains = round(market_value - self.initial_value, 2)
+        result = (market_value, day_gains, total_gains)
+        self._valuation = (quote, result)
+        return result
 
     @property
     def total_gains(self):
@@ -368,19 +881,17 @@ class Lot(object):
         Returns:
             float: current market value - initial value
         """
-        return round(self.market_value - self.initial_value, 2)
+        return self._valuate()[2]
 
     @property
     def day_gains(self):
         """The increase in value of this holding in the current or previous day
 
         Returns:
-            float: Price in USD of current market value - value at open
+            float: Price in USD of current market value - value at open, or
+                None if the quote has no open price
         """
-        open_price = Data.quote(self.symbol)['open']
-        current_price = Data.price(self.symbol)
-        return round((current_price * self.shares) - (open_price * self.shares),
-                     2)
+        return self._valuate()[1]
 
     @property
     def market_value(self):
@@ -389,7 +900,7 @@ class Lot(object):
         Returns:
             float: the value of the lot multipled by shares
         """
-        return round(self.shares * Data.price(self.symbol), 2)
+        return self._valuate()[0]
 
     def __lt__(self, other):
 
@@ -399,4 +910,98 @@ class Lot(object):
 
         return (f'{self.date.strftime(self._dateformat)} :: {self.shares} '
                 f'shares {self.symbol} @ {self.cost_basis}')
-        
\ No newline at end of file
+
+
+class LotView(object):
+    """A read-only view of a selection of lots from one or more holdings
+
+    Returned by lot queries so that results refer to the lots held rather than
+    copying them. Views are taken over the immutable lots of a snapshot, so a
+    view keeps reflecting the lots at the time of the query when lots are
+    later added or removed.
+
+    Args:
+        segments (list of tuple): (lots, indexes) pairs, where lots is a
+            sequence of Lots and indexes the positions in it that are part of
+            the view.
+    """
+
+    def __init__(self, segments):
+
+        self._segments = segments
+
+    def __len__(self):
+
+        return sum(len(indexes) for _, indexes in self._segments)
+
+    def __iter__(self):
+
+        for lots, indexes in self._segments:
+            for index in indexes:
+                yield lots[index]
+
+    def __getitem__(self, item):
+
+        if isinstance(item, slice):
+            start, stop, step = item.indices(len(self))
+            offsets = []
+            offset = 0
+            for lots, indexes in self._segments:
+                offsets.append((lots, indexes, offset))
+                offset += len(indexes)
+            if step < 0:
+                offsets.reverse()
+            segments = []
+            for lots, indexes, offset in offsets:
+                # The first and last positions of the slice in this segment
+                if step > 0:
+                    first = max(start, offset)
+                    first += (start - first) % step
+                    last = min(stop, offset + len(indexes))
+                    if first < last:
+                        segments.append((lots, indexes[first - offset:
+                                                       last - offset:step]))
+                else:
+                    first = min(start, offset + len(indexes) - 1)
+                    first -= (first - start) % -step
+                    last = max(stop, offset - 1)
+                    if first > last:
+                        end = last - offset if last >= offset else None
+                        segments.append((lots, indexes[first - offset:
+                                                       end:step]))
+            return LotView(segments)
+        if not isinstance(item, int):
+            raise TypeError(f'LotView indices must be integers or slices, '
+                            f'not {type(item).__name__}')
+        if item < 0:
+            item += len(self)
+        if item >= 0:
+            for lots, indexes in self._segments:
+                if item < len(indexes):
+                    return lots[indexes[item]]
+                item -= len(indexes)
+        raise IndexError('LotView index out of range')
+
+    def __repr__(self):
+
+        return f'LotView: {list(self)}'
+
+
+def _date_range(dates, start=None, end=None):
+    """Bisects a sorted list of dates for the positions in an inclusive range
+
+    Args:
+        dates (list of date): Sorted lot dates.
+        start (str or date, optional): The first date in the range.
+        end (str or date, optional): The last date in the range.
+    Returns:
+        tuple of int: The low (inclusive) and high (exclusive) positions.
+    """
+
+    if isinstance(start, str):
+        start = datetime.strptime(start, Lot._dateformat).date()
+    if isinstance(end, str):
+        end = datetime.strptime(end, Lot._dateformat).date()
+    low = 0 if start is None else bisect_left(dates, start)
+    high = len(dates) if end is None else bisect_right(dates, end)
+    return low, high
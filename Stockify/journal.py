@@ -0,0 +1,230 @@
+import json
+import os
+import threading
+from .errors import StockifyError
+
+
+class Journal(object):
+    """Append-only storage for a portfolio: a snapshot plus a log of changes
+
+    Journals are normally created with `Portfolio.open_journal()`. Each change
+    to the portfolio is appended to the log as one JSON line with a sequence
+    number; the snapshot records the sequence number it includes changes up
+    to. Loading reads the snapshot and replays the newer log records on top of
+    it, so a crash during compaction or in the middle of appending a record
+    never leaves the portfolio unreadable.
+
+    Args:
+        portfolio (Portfolio): The portfolio to be stored.
+        filename (str): The snapshot filename. The log is stored next to it
+            with a '.log' extension appended.
+        sync_every (int, optional): Records are flushed to disk with fsync
+            after this many changes. Defaults to 100.
+        compact_every (int, optional): If specified, the log is compacted
+            automatically once it holds this many records.
+    """
+
+    def __init__(self, portfolio, filename, sync_every=100,
+                 compact_every=None):
+
+        self.portfolio = portfolio
+        self.filename = filename
+        self.log_filename = filename + '.log'
+        self.sync_every = sync_every
+        self.compact_every = compact_every
+        self.sequence = 0
+        self._log = None
+        self._log_records = 0
+        self._unsynced = 0
+        # Held by writers while they publish a change and record it, so that
+        # compaction never sees a change without its record or vice versa
+        self.lock = threading.RLock()
+
+    def load(self, read_only=False):
+        """Loads the snapshot and log into the portfolio and opens the log
+
+        A partially written record at the end of the log, left by a crash, is
+        discarded.
+
+        Args:
+            read_only (bool, optional): Only load the portfolio, without
+                opening the log for writing or truncating a partial record.
+                Defaults to False.
+        Raises:
+            StockifyError: If a record in the log is not a known operation,
+                or refers to a symbol that is not a holding.
+        """
+
+        if os.path.exists(self.filename):
+            with open(self.filename, 'r') as snapshot:
+                snapshot_data = json.load(snapshot)
+            self.portfolio._import_data(snapshot_data['holdings'])
+            self.sequence = snapshot_data['sequence']
+
+        valid_length = 0
+        # Consecutive records that can be replayed as a single change
+        pending = []
+        if os.path.exists(self.log_filename):
+            with open(self.log_filename, 'rb') as log:
+                for line in log:
+                    try:
+                        record = json.loads(line.decode('utf-8'))
+                    except ValueError:
+                        break
+                    if not line.endswith(b'\n'):
+                        break
+                    valid_length += len(line)
+                    self._log_records += 1
+                    if record['seq'] > self.sequence:
+                        if pending and not self._batchable(pending[-1],
+                                                           record):
+                            self._replay(pending)
+                            pending = []
+                        pending.append(record)
+                        self.sequence = record['seq']
+        if pending:
+            self._replay(pending)
+
+        if read_only:
+            return
+        self._log = open(self.log_filename, 'ab')
+        self._log.truncate(valid_length)
+
+    @staticmethod
+    def _batchable(previous, record):
+        """Whether a record can be replayed together with the previous one
+
+        Args:
+            previous (dict): The previous record.
+            record (dict): The next record.
+        Returns:
+            bool: True for consecutive 'add_holding' records, and consecutive
+                'add_lot' records of the same holding.
+        """
+
+        if previous['op'] != record['op']:
+            return False
+        return (record['op'] == 'add_holding' or
+                (record['op'] == 'add_lot' and
+                 previous['symbol'] == record['symbol']))
+
+    def _replay(self, records):
+        """Applies log records to the portfolio
+
+        Args:
+            records (list of dict): Records written by `.record()`. If more
+                than one, they must be batchable (see `._batchable()`).
+        Raises:
+            StockifyError: If a record is not a known operation, or refers to
+                a symbol that is not a holding.
+        """
+
+        operation = records[0]['op']
+        if operation == 'add_holding':
+            self.portfolio.add_holdings([record['symbol']
+                                         for record in records])
+            return
+        if operation == 'add_lot':
+            self._holding(records[0]).add_lots(
+                [[record['date'], record['cost_basis'], record['shares']]
+                 for record in records])
+            return
+        for record in records:
+            operation = record['op']
+            if operation == 'remove_holding':
+                self._holding(record)
+                self.portfolio.remove(record['symbol'])
+            elif operation == 'add_lot':
+                self._holding(record).add_lot(record['date'],
+                                              record['cost_basis'],
+                                              record['shares'])
+            elif operation == 'remove_lot':
+                self._holding(record).remove(record['index'])
+            else:
+                raise StockifyError(f'Unknown journal operation: {operation}')
+
+    def _holding(self, record):
+        """Looks up the holding a log record applies to
+
+        Args:
+            record (dict): A record written by `.record()`.
+        Returns:
+            Holding: The holding of the record's symbol.
+        Raises:
+            StockifyError: If the portfolio has no holding of that symbol.
+        """
+
+        symbol = record['symbol']
+        if symbol not in self.portfolio.holdings:
+            raise StockifyError(f'Journal record {record["seq"]} refers to '
+                                f'{symbol}, which is not a holding')
+        return self.portfolio.holdings[symbol]
+
+    def record(self, operation, **fields):
+        """Appends a change to the log
+
+        Args:
+            operation (str): One of 'add_holding', 'remove_holding', 'add_lot'
+                or 'remove_lot'.
+            **fields: The arguments needed to replay the operation.
+        """
+
+        with self.lock:
+            self.sequence += 1
+            record = {'seq': self.sequence, 'op': operation}
+            record.update(fields)
+            self._log.write(json.dumps(record).encode('utf-8') + b'\n')
+            self._log_records += 1
+            self._unsynced += 1
+            if self._unsynced >= self.sync_every:
+                self.sync()
+
+    def maybe_compact(self):
+        """Compacts the log if it holds at least `compact_every` records
+
+        Called by writers once every record of a change has been written, so
+        that a snapshot never includes part of a change whose remaining
+        records would then be replayed again on load.
+        """
+
+        with self.lock:
+            if self.compact_every and self._log_records >= self.compact_every:
+                self.compact()
+
+    def sync(self):
+        """Flushes any unsynced records to disk"""
+
+        with self.lock:
+            self._log.flush()
+            os.fsync(self._log.fileno())
+            self._unsynced = 0
+
+    def compact(self):
+        """Writes a new snapshot of the portfolio and empties the log
+
+        The snapshot is written to a temporary file and moved into place, so
+        the previous snapshot and log remain valid until it is complete.
+        """
+
+        with self.lock:
+            snapshot_data = {'sequence': self.sequence,
+                             'holdings': self.portfolio._export_data()}
+            temp_filename = self.filename + '.tmp'
+            with open(temp_filename, 'w') as snapshot:
+                json.dump(snapshot_data, snapshot)
+                snapshot.flush()
+                os.fsync(snapshot.fileno())
+            os.replace(temp_filename, self.filename)
+
+            self._log.truncate(0)
+            self.sync()
+            self._log_records = 0
+
+    def close(self):
+        """Syncs and closes the log"""
+
+        with self.lock:
+            if self._log:
+                self.sync()
+                self._log.close()
+                self._log = None
@@ -17,6 +17,9 @@ setup(name='Stockify',
       packages=['Stockify'],
       python_requires='>=3.6',
       install_requires=['requests'],
+      entry_points={
+            'console_scripts': ['stockify=Stockify.cli:main']
+      },
       long_description=long_description,
       long_description_content_type='text/markdown',
       classifiers=[
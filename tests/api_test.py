@@ -1,5 +1,6 @@
 import unittest
 import os
+from unittest import mock
 import Stockify
 
 try:
@@ -27,5 +28,43 @@ class APITest(unittest.TestCase):
         self.assertNotIn('Error Message', result.keys(),
                          "API call returned an error.")
 
+    def test_quote_batch(self):
+        quotes = {'AAPL': {'latestPrice': 150.0, 'open': 140.0},
+                  'MS': {'latestPrice': 50.0, 'open': 51.0}}
+        batch = Stockify.QuoteBatch(quotes)
+        self.assertEqual(2, len(batch))
+        self.assertIn('aapl', batch)
+        quote = batch['ms']
+        self.assertEqual('MS', quote.symbol)
+        self.assertEqual(50.0, quote.latest_price)
+        self.assertEqual(51.0, quote.open)
+
+    def test_compact_quote(self):
+        symbol = 'AAPL'
+        result = Stockify.Data.compact_quote(symbol)
+        self.assertEqual(symbol, result.symbol)
+        self.assertIsInstance(result.latest_price, float)
+
+    def test_quote_fields(self):
+        response = mock.Mock(status_code=200,
+                             text='{"latestPrice": 150.0, "open": 140.0}')
+        with mock.patch('Stockify.api.requests.get',
+                        return_value=response) as get:
+            result = Stockify.Data.compact_quote('aapl')
+            get.assert_called_once_with(
+                'https://api.iextrading.com/1.0/stock/aapl/quote'
+                '?filter=latestPrice,open')
+        self.assertEqual(150.0, result.latest_price)
+
+        response.text = '{"AAPL": {"quote": {"latestPrice": 150.0}}}'
+        with mock.patch('Stockify.api.requests.get',
+                        return_value=response) as get:
+            result = Stockify.Data.batch_quote(['aapl', 'ms'],
+                                               fields=['latestPrice'])
+            get.assert_called_once_with(
+                'https://api.iextrading.com/1.0/stock/market/batch'
+                '?symbols=AAPL,MS&types=quote&filter=latestPrice')
+        self.assertEqual({'AAPL': {'latestPrice': 150.0}}, result)
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,62 @@
+import unittest
+import os
+import tempfile
+import Stockify
+
+
+class BatchTest(unittest.TestCase):
+
+    quotes = {'AAPL': {'latestPrice': 150.0, 'open': 140.0},
+              'MS': {'latestPrice': 50.0, 'open': 51.0}}
+
+    def test_evaluate(self):
+
+        portfolio1 = Stockify.Portfolio(['aapl', 'ms'])
+        portfolio1['aapl'].add_lot('2018-08-06', 120.10, 5)
+        portfolio1['ms'].add_lot('2018-07-01', 40.00, 10)
+        portfolio2 = Stockify.Portfolio(['ms'])
+        portfolio2['ms'].add_lot('2018-07-01', 60.00, 2)
+
+        for processes in (1, 2):
+            evaluator = Stockify.BatchEvaluator(processes=processes)
+            results = dict(evaluator.evaluate({'p1': portfolio1,
+                                               'p2': portfolio2},
+                                              quotes=self.quotes))
+            self.assertEqual(1250.0, results['p1']['value'])
+            self.assertAlmostEqual(40.0, results['p1']['gains']['day'])
+            self.assertAlmostEqual(249.5, results['p1']['gains']['total'])
+            self.assertEqual(100.0, results['p2']['value'])
+            self.assertAlmostEqual(-20.0, results['p2']['gains']['total'])
+
+    def test_evaluate_files(self):
+
+        with tempfile.TemporaryDirectory() as directory:
+            filenames = []
+            for number in range(20):
+                portfolio = Stockify.Portfolio(['aapl', 'ms'])
+                portfolio['aapl'].add_lot('2018-08-06', 120.10, number + 1)
+                portfolio['ms'].add_lot('2018-07-01', 40.00, 10)
+                filename = os.path.join(directory, f'{number}.json')
+                portfolio.to_file(filename)
+                filenames.append(filename)
+            missing = os.path.join(directory, 'missing.json')
+
+            for processes in (1, 2):
+                # Files are loaded by one pool of workers for both calls
+                with Stockify.BatchEvaluator(processes=processes) as evaluator:
+                    for _ in range(2):
+                        results = dict(evaluator.evaluate(filenames,
+                                                          quotes=self.quotes))
+                        self.assertEqual(20, len(results))
+                        self.assertEqual(150.0 * 8 + 500.0,
+                                         results[filenames[7]]['value'])
+                    loaded = list(evaluator.load_positions([missing]))
+                    self.assertEqual(missing, loaded[0][0])
+                    self.assertIsNone(loaded[0][1])
+                    self.assertIsInstance(loaded[0][2], OSError)
+                    with self.assertRaises(OSError):
+                        dict(evaluator.evaluate([missing], quotes=self.quotes))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,115 @@
+import unittest
+import os
+import json
+import tempfile
+import multiprocessing
+from unittest import mock
+import Stockify
+from Stockify import cli
+
+
+class CLITest(unittest.TestCase):
+
+    quotes = {'AAPL': {'latestPrice': 150.0, 'open': 140.0},
+              'MS': {'latestPrice': 50.0, 'open': 51.0}}
+
+    def setUp(self):
+
+        self.directory = tempfile.TemporaryDirectory()
+        path = self.directory.name
+
+        portfolio = Stockify.Portfolio(['aapl'])
+        portfolio['aapl'].add_lot('2018-08-06', 120.10, 5)
+        portfolio.to_file(os.path.join(path, 'a.json'))
+
+        portfolio = Stockify.Portfolio(['ms'])
+        portfolio['ms'].add_lot('2018-07-01', 40.00, 10)
+        portfolio.to_file(os.path.join(path, 'b.csv'), file_format='csv')
+
+        # A journaled portfolio, with changes both in the snapshot and the log
+        journaled = Stockify.Portfolio()
+        journaled.open_journal(os.path.join(path, 'c.json'))
+        journaled.add_holding('aapl')
+        journaled['aapl'].add_lot('2018-08-06', 120.10, 5)
+        journaled.compact()
+        journaled.add_holding('ms')
+        journaled['ms'].add_lot('2018-07-01', 40.00, 10)
+        journaled.close_journal()
+
+        with open(os.path.join(path, 'd.json'), 'w') as outfile:
+            json.dump({'not': 'a portfolio'}, outfile)
+
+        portfolio = Stockify.Portfolio(['zzzz'])
+        portfolio['zzzz'].add_lot('2018-07-01', 1.00, 1)
+        portfolio.to_file(os.path.join(path, 'e.json'))
+
+        with open(os.path.join(path, 'notes.txt'), 'w') as outfile:
+            outfile.write('Not a portfolio file')
+
+    def tearDown(self):
+
+        self.directory.cleanup()
+
+    def run_main(self, paths, processes=1):
+
+        output = os.path.join(self.directory.name, 'results.out')
+        with mock.patch.object(Stockify.Data, 'batch_quote',
+                               return_value=self.quotes) as batch_quote:
+            status = cli.main(paths + ['-o', output, '-p', str(processes),
+                                       '-c', '2'])
+        with open(output) as infile:
+            records = [json.loads(line) for line in infile]
+        return status, {os.path.basename(record['file']): record
+                        for record in records}, batch_quote
+
+    def test_iter_files(self):
+
+        path = self.directory.name
+        files = sorted(os.path.basename(filename)
+                       for filename in cli.iter_files([path]))
+        self.assertEqual(['a.json', 'b.csv', 'c.json', 'd.json', 'e.json'],
+                         files)
+        files = list(cli.iter_files([os.path.join(path, '*.csv')]))
+        self.assertEqual([os.path.join(path, 'b.csv')], files)
+
+    def test_main(self):
+
+        status, records, batch_quote = self.run_main([self.directory.name])
+        self.assertEqual(1, status)
+        self.assertEqual(5, len(records))
+        self.assertEqual(750.0, records['a.json']['value'])
+        self.assertAlmostEqual(50.0, records['a.json']['gains']['day'])
+        self.assertEqual(500.0, records['b.csv']['value'])
+        self.assertEqual(1250.0, records['c.json']['value'])
+        self.assertIn('error', records['d.json'])
+        self.assertIn('ZZZZ', records['e.json']['error'])
+        self.assertNotIn('value', records['e.json'])
+        # Quotes are shared across chunks, so only new symbols are requested
+        requested = [symbol for call in batch_quote.call_args_list
+                     for symbol in call[0][0]]
+        self.assertEqual(sorted(set(requested)), sorted(requested))
+
+    def test_main_processes(self):
+
+        # One pool of workers loads the files of every chunk
+        with mock.patch('multiprocessing.Pool',
+                        wraps=multiprocessing.Pool) as pool:
+            status, records, _ = self.run_main([self.directory.name],
+                                               processes=2)
+        self.assertEqual(1, pool.call_count)
+        self.assertEqual(1, status)
+        self.assertEqual(5, len(records))
+        self.assertEqual(1250.0, records['c.json']['value'])
+        self.assertIn('error', records['d.json'])
+
+    def test_main_success(self):
+
+        status, records, _ = self.run_main(
+            [os.path.join(self.directory.name, 'b.csv'),
+             os.path.join(self.directory.name, 'a.json')])
+        self.assertEqual(0, status)
+        self.assertEqual(['a.json', 'b.csv'], sorted(records))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,4 +1,10 @@
 import unittest
+import os
+import json
+import time
+import tempfile
+import threading
+from unittest import mock
 import Stockify
 
 
@@ -43,6 +49,282 @@ class PortfolioTest(unittest.TestCase):
         first_lot = portfolio['ms'][0]
         self.assertEqual(6, first_lot.shares)
 
+    def test_query_lots(self):
+
+        portfolio = Stockify.Portfolio(['aapl', 'ms'])
+        portfolio['aapl'].add_lots([['2018-01-15', 150.00, 5],
+                                    ['2018-07-01', 120.00, 2]])
+        portfolio['ms'].add_lots([['2018-06-30', 40.00, 10],
+                                  ['2017-12-31', 60.00, 1]])
+        lots = portfolio.query_lots('2018-01-01', '2018-06-30')
+        self.assertEqual(['2018-01-15', '2018-06-30'],
+                         [str(lot.date) for lot in lots])
+        self.assertEqual(2, len(portfolio.query_lots(symbols=['aapl'])))
+        all_lots = portfolio.query_lots()
+        self.assertEqual(['2018-01-15', '2018-06-30'],
+                         [str(lot.date) for lot in all_lots[1:3]])
+        self.assertEqual(2, len(all_lots[::2]))
+        self.assertEqual(['2018-07-01', '2018-01-15'],
+                         [str(lot.date) for lot in all_lots[::-2]])
+        # Stepped slices are views of the holdings' lots too
+        by_holding = portfolio.query_lots(symbols=['aapl', 'ms'])[::-2]
+        self.assertEqual(['2018-06-30', '2018-07-01'],
+                         [str(lot.date) for lot in by_holding])
+        self.assertIs(portfolio['ms'].lots, by_holding._segments[0][0])
+        self.assertEqual('2018-07-01', str(all_lots[-1].date))
+        with self.assertRaises(TypeError):
+            all_lots['2018-01-15']
+
+        quotes = {'AAPL': {'latestPrice': 130.0},
+                  'MS': {'latestPrice': 50.0}}
+        under_water = portfolio.query_lots('2018-01-01', '2018-06-30',
+                                           gain_below=0, quotes=quotes)
+        self.assertEqual(1, len(under_water))
+        self.assertEqual('AAPL', under_water[0].symbol)
+        quotes['MS'] = {'latestPrice': None}
+        with self.assertRaises(Stockify.StockifyError):
+            portfolio.query_lots(gain_below=0, quotes=quotes)
+
+    def test_journal(self):
+
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, 'portfolio.json')
+            portfolio = Stockify.Portfolio()
+            portfolio.open_journal(filename)
+            portfolio.add_holding('aapl')
+            portfolio['aapl'].add_lots([['2018-08-06', 120.10, 5],
+                                        ['2018-07-01', 123.12, 6]])
+            portfolio.compact()
+            portfolio.add_holding('ms')
+            portfolio['ms'].add_lot('2018-08-01', 40.00, 2)
+            portfolio['aapl'].remove(0)
+            portfolio.close_journal()
+            # Simulate a crash in the middle of appending a record
+            with open(filename + '.log', 'a') as log:
+                log.write('{"seq": 99, "op": "add_')
+
+            loaded = Stockify.Portfolio()
+            loaded.open_journal(filename)
+            self.assertEqual(2, len(loaded))
+            self.assertEqual(1, len(loaded['aapl']))
+            self.assertEqual(5, loaded['aapl'][0].shares)
+            self.assertEqual(2, loaded['ms'][0].shares)
+            loaded.close_journal()
+
+    def test_journal_auto_compact(self):
+
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, 'portfolio.json')
+            portfolio = Stockify.Portfolio()
+            portfolio.open_journal(filename, compact_every=3)
+            portfolio.add_holding('aapl')
+            # Crosses compact_every part way through the records of one change
+            portfolio['aapl'].add_lots([['2018-08-06', 120.10, 5],
+                                        ['2018-07-01', 123.12, 6],
+                                        ['2018-06-01', 110.00, 1],
+                                        ['2018-05-01', 100.00, 2]])
+            portfolio.close_journal()
+
+            loaded = Stockify.Portfolio()
+            loaded.open_journal(filename)
+            self.assertEqual(4, len(loaded['aapl']))
+            self.assertEqual(14, loaded['aapl'].total_shares)
+            loaded.close_journal()
+
+    def test_journal_detached_holdings(self):
+
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, 'portfolio.json')
+            portfolio = Stockify.Portfolio()
+            portfolio.open_journal(filename)
+            portfolio.add_holdings(['ms', 'aapl'])
+            removed = portfolio['ms']
+            replaced = portfolio['aapl']
+            portfolio.remove('ms')
+            portfolio.add_holding('aapl')
+            # Changes to holdings no longer in the portfolio are not recorded
+            removed.add_lot('2018-08-01', 40.00, 2)
+            replaced.add_lot('2018-08-01', 120.00, 1)
+            replaced.remove(0)
+            portfolio.close_journal()
+
+            loaded = Stockify.Portfolio()
+            loaded.open_journal(filename)
+            self.assertEqual(['AAPL'], list(loaded.holdings))
+            self.assertEqual(0, len(loaded['aapl']))
+            loaded.close_journal()
+
+            with open(filename + '.log', 'a') as log:
+                log.write(json.dumps({'seq': 99, 'op': 'add_lot',
+                                      'symbol': 'MS', 'date': '2018-08-01',
+                                      'cost_basis': 40.00, 'shares': 2}) + '\n')
+            with self.assertRaises(Stockify.StockifyError):
+                Stockify.Portfolio().open_journal(filename)
+
+    def test_exposure(self):
+
+        portfolio = Stockify.Portfolio(['aapl', 'msft', 'ms'])
+        portfolio['aapl'].add_lot('2018-08-06', 120.10, 3)
+        portfolio['msft'].add_lot('2018-08-06', 100.00, 1)
+        portfolio['ms'].add_lot('2018-08-01', 40.00, 10)
+        quotes = {'AAPL': {'latestPrice': 100.0},
+                  'MSFT': {'latestPrice': 100.0},
+                  'MS': {'latestPrice': 60.0}}
+        now = time.time()
+        entries = {
+            'AAPL': {'companyName': 'Apple Inc.', 'sector': 'Technology',
+                     'primaryExchange': 'Nasdaq', 'fetched': now},
+            'MSFT': {'companyName': 'Microsoft', 'sector': 'Technology',
+                     'primaryExchange': 'Nasdaq', 'fetched': now},
+            'MS': {'companyName': 'Morgan Stanley', 'sector': 'Financial',
+                   'primaryExchange': 'NYSE', 'fetched': now}
+        }
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, 'reference.json')
+            with open(filename, 'w') as cachefile:
+                json.dump(entries, cachefile)
+            reference_data = Stockify.ReferenceData(filename)
+            exposure = portfolio.get_exposure(quotes=quotes,
+                                              reference_data=reference_data)
+            self.assertEqual(400.0, exposure['Technology']['value'])
+            self.assertEqual(0.6, exposure['Financial']['weight'])
+            exposure = portfolio.get_exposure('exchange', quotes=quotes,
+                                              reference_data=reference_data)
+            self.assertEqual(['NYSE', 'Nasdaq'], sorted(exposure))
+
+            quotes['MS'] = {'latestPrice': None}
+            with self.assertRaises(Stockify.StockifyError):
+                portfolio.get_exposure(quotes=quotes,
+                                       reference_data=reference_data)
+            del quotes['MS']
+            with self.assertRaises(Stockify.StockifyError):
+                portfolio.get_exposure(quotes=quotes,
+                                       reference_data=reference_data)
+
+            # Symbols that are not found are only requested once per TTL
+            with mock.patch.object(Stockify.Data, 'batch_quote',
+                                   return_value={}) as batch_quote:
+                reference_data.prefetch(['zzzz'])
+                self.assertEqual({}, reference_data.prefetch(['zzzz']))
+                self.assertEqual(1, batch_quote.call_count)
+
+    def test_concurrent_writes(self):
+
+        portfolio = Stockify.Portfolio(['aapl'])
+        errors = []
+
+        def write(thread_number):
+            for i in range(200):
+                portfolio['aapl'].add_lot('2018-01-01', 100.0, 1)
+                portfolio.add_holding(f'sym{thread_number}_{i}')
+
+        def read():
+            for _ in range(200):
+                for state in portfolio.snapshot().values():
+                    if state.total_shares != sum(lot.shares
+                                                 for lot in state.lots):
+                        errors.append(state)
+
+        threads = [threading.Thread(target=write, args=(n,)) for n in range(4)]
+        threads += [threading.Thread(target=read) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual([], errors)
+        self.assertEqual(800, portfolio['aapl'].total_shares)
+        self.assertEqual(801, len(portfolio))
+
+    def test_memoized_valuation(self):
+
+        prices = {'AAPL': {'latestPrice': 150.0, 'open': 140.0},
+                  'MS': {'latestPrice': 50.0, 'open': 51.0}}
+        fetched = []
+
+        def compact_quotes(symbol_list):
+            fetched.append(sorted(symbol_list))
+            return Stockify.QuoteBatch({symbol: prices[symbol]
+                                        for symbol in symbol_list})
+
+        cache = Stockify.QuoteCache(ttl=60)
+        with mock.patch.object(Stockify.QuoteCache, '_default', cache), \
+                mock.patch.object(Stockify.Data, 'compact_quotes',
+                                  side_effect=compact_quotes):
+            portfolio = Stockify.Portfolio(['aapl', 'ms'])
+            portfolio['aapl'].add_lot('2018-08-06', 120.10, 5)
+            portfolio['ms'].add_lot('2018-07-01', 40.00, 10)
+            self.assertEqual(1250.0, portfolio.get_value())
+            gains = portfolio.get_gains()
+            self.assertAlmostEqual(249.5, gains[-1]['total']['total'])
+            self.assertEqual(1, len(fetched))
+
+            aapl_valuation = portfolio['aapl']._valuation
+            portfolio['ms'].add_lot('2018-08-01', 45.00, 2)
+            self.assertEqual(1350.0, portfolio.get_value())
+            self.assertIs(aapl_valuation, portfolio['aapl']._valuation)
+
+            prices['MS'] = {'latestPrice': 55.0, 'open': 51.0}
+            cache.invalidate()
+            self.assertEqual(1410.0, portfolio.get_value())
+            self.assertIs(aapl_valuation, portfolio['aapl']._valuation)
+            self.assertEqual(149.5, portfolio['aapl'][0].total_gains)
+            self.assertEqual(50.0, portfolio['aapl'][0].day_gains)
+            self.assertEqual(2, len(fetched))
+
+    def test_missing_open_price(self):
+
+        quotes = {'AAPL': {'latestPrice': 150.0, 'open': None}}
+        cache = Stockify.QuoteCache(ttl=60)
+        with mock.patch.object(Stockify.QuoteCache, '_default', cache), \
+                mock.patch.object(Stockify.Data, 'batch_quote',
+                                  return_value=quotes):
+            portfolio = Stockify.Portfolio(['aapl'])
+            portfolio['aapl'].add_lot('2018-08-06', 120.10, 5)
+            self.assertEqual(150.0, portfolio['aapl'].get_price())
+            self.assertEqual(750.0, portfolio.get_value())
+            self.assertEqual(750.0, portfolio['aapl'].get_value())
+            self.assertEqual({'day': None, 'total': 149.5},
+                             portfolio['aapl'].get_gains())
+            self.assertEqual({'day': None, 'total': 149.5},
+                             portfolio.get_gains()[-1]['total'])
+            self.assertIsNone(portfolio['aapl'][0].day_gains)
+
+    def test_missing_latest_price(self):
+
+        quotes = {'AAPL': {'latestPrice': None, 'open': 140.0}}
+        cache = Stockify.QuoteCache(ttl=60)
+        with mock.patch.object(Stockify.QuoteCache, '_default', cache), \
+                mock.patch.object(Stockify.Data, 'batch_quote',
+                                  return_value=quotes):
+            portfolio = Stockify.Portfolio(['aapl'])
+            portfolio['aapl'].add_lot('2018-08-06', 120.10, 5)
+            with self.assertRaises(Stockify.StockifyAPIError):
+                portfolio.get_value()
+            with self.assertRaises(Stockify.StockifyAPIError):
+                portfolio.get_gains()
+
+    def test_quote_cache_single_flight(self):
+
+        calls = []
+
+        def compact_quotes(symbol_list):
+            calls.append(symbol_list)
+            time.sleep(0.1)
+            return Stockify.QuoteBatch({'AAPL': {'latestPrice': 150.0,
+                                                 'open': 140.0}})
+
+        cache = Stockify.QuoteCache(ttl=60)
+        with mock.patch.object(Stockify.Data, 'compact_quotes',
+                               side_effect=compact_quotes):
+            threads = [threading.Thread(target=cache.get, args=(['aapl'],))
+                       for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(1, len(calls))
+        self.assertEqual(150.0, cache.get_quote('aapl').latest_price)
+
 
 if __name__ == '__main__':
     unittest.main()